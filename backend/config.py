@@ -8,6 +8,31 @@ import os
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/falcon")
 DB_MIN_CONNECTIONS = int(os.getenv("DB_MIN_CONNECTIONS", "2"))
 DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "10"))
+# JIT compilation costs ~10-100ms per query and only pays off on long
+# analytical scans; our queries are short, repo-scoped lookups.
+DB_JIT = os.getenv("DB_JIT", "off")
+# Per-connection prepared statement LRU (asyncpg prepares every query on first
+# use). Sized to hold every query shape the routes and tools issue.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
 
 # Ingestion
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(500 * 1024)))  # 500KB
+GIT_CLONE_TIMEOUT = float(os.getenv("GIT_CLONE_TIMEOUT", "300"))  # seconds
+# COPY batches during ingestion — one round of work for the server while the
+# next batch is being read. A batch is sent at whichever limit it hits first,
+# so it holds at most COPY_BATCH_BYTES + MAX_FILE_SIZE of content.
+COPY_BATCH_ROWS = int(os.getenv("COPY_BATCH_ROWS", "5000"))
+COPY_BATCH_BYTES = int(os.getenv("COPY_BATCH_BYTES", str(16 * 1024 * 1024)))
+# Threads reading file contents during ingestion (I/O-bound, so > cpu count)
+INGEST_READ_WORKERS = int(
+    os.getenv("INGEST_READ_WORKERS", str(min(32, (os.cpu_count() or 1) * 4)))
+)
+
+# CORS — comma-separated list of frontend origins (Next.js dev server by default)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000"
+    ).split(",")
+    if origin.strip()
+]
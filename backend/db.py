@@ -9,9 +9,17 @@ Usage in FastAPI:
         ...
 """
 
+import asyncio
+
 import asyncpg
 
-from backend.config import DATABASE_URL, DB_MIN_CONNECTIONS, DB_MAX_CONNECTIONS
+from backend.config import (
+    DATABASE_URL,
+    DB_JIT,
+    DB_MAX_CONNECTIONS,
+    DB_MIN_CONNECTIONS,
+    DB_STATEMENT_CACHE_SIZE,
+)
 
 
 pool: asyncpg.Pool | None = None
@@ -27,10 +35,12 @@ async def init_db():
         DATABASE_URL,
         min_size=DB_MIN_CONNECTIONS,
         max_size=DB_MAX_CONNECTIONS,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        # Per-session settings, applied once when each pooled connection opens
+        server_settings={"jit": DB_JIT},
     )
 
-    async with pool.acquire() as conn:
-        await _create_schema(conn)
+    await _create_schema(pool)
 
 
 async def close_db():
@@ -41,6 +51,16 @@ async def close_db():
         pool = None
 
 
+def get_pool() -> asyncpg.Pool:
+    """
+    FastAPI dependency that returns the pool itself.
+
+    For handlers whose work outlives the request scope (SSE streams) or
+    that need several connections at once (concurrent tool calls).
+    """
+    return pool
+
+
 async def get_conn():
     """
     FastAPI dependency that yields a connection from the pool.
@@ -56,65 +76,107 @@ async def get_conn():
 
 # ---------------------------------------------------------------------------
 # Schema — idempotent (IF NOT EXISTS everywhere)
+#
+# Tables go first as one multi-statement script: a single round trip, run by
+# Postgres as one implicit transaction. Indexes depend on the tables but not
+# on each other, so they are then built in parallel, one pooled connection
+# each — startup waits for the slowest index build, not the sum of them.
 # ---------------------------------------------------------------------------
-async def _create_schema(conn: asyncpg.Connection):
-    await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
-
-    await conn.execute("""
-        CREATE TABLE IF NOT EXISTS repos (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            url TEXT NOT NULL UNIQUE,
-            name TEXT NOT NULL,
-            ingested_at TIMESTAMP DEFAULT now(),
-            status TEXT DEFAULT 'pending'
-        );
-    """)
-
-    await conn.execute("""
-        CREATE TABLE IF NOT EXISTS files (
-            id BIGSERIAL PRIMARY KEY,
-            repo_id UUID NOT NULL REFERENCES repos(id) ON DELETE CASCADE,
-            path TEXT NOT NULL,
-            name TEXT NOT NULL,
-            extension TEXT,
-            parent_path TEXT NOT NULL,
-            depth INTEGER NOT NULL,
-            is_directory BOOLEAN DEFAULT FALSE,
-            content TEXT,
-            UNIQUE(repo_id, path)
-        );
-    """)
-
-    # Indexes — each one supports a specific tool query pattern.
-    # CREATE INDEX IF NOT EXISTS is safe to run repeatedly.
-    #
+_TABLES_SQL = """
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+    CREATE TABLE IF NOT EXISTS repos (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        url TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        ingested_at TIMESTAMP DEFAULT now(),
+        status TEXT DEFAULT 'pending',
+        file_count INTEGER DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS files (
+        id BIGSERIAL PRIMARY KEY,
+        repo_id UUID NOT NULL REFERENCES repos(id) ON DELETE CASCADE,
+        path TEXT NOT NULL,
+        name TEXT NOT NULL,
+        extension TEXT,
+        parent_path TEXT NOT NULL,
+        depth INTEGER NOT NULL,
+        is_directory BOOLEAN DEFAULT FALSE,
+        content TEXT,
+        UNIQUE(repo_id, path)
+    );
+
+    -- file_count is written once at the end of ingestion so GET /repos/{id}
+    -- doesn't count(*) the files on every call. Older databases get the
+    -- column and a one-time backfill here. Guarded by a catalog check: ALTER
+    -- TABLE takes an ACCESS EXCLUSIVE lock even when there's nothing to do,
+    -- and would queue behind any running ingest (and every repos read behind
+    -- it) each time an instance starts.
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'repos'
+              AND column_name = 'file_count'
+        ) THEN
+            ALTER TABLE repos ADD COLUMN file_count INTEGER DEFAULT 0;
+            UPDATE repos r SET file_count = (
+                SELECT count(*) FROM files f
+                WHERE f.repo_id = r.id AND f.is_directory = false
+            );
+        END IF;
+    END
+    $$;
+"""
+
+# Indexes — each one supports a specific tool query pattern.
+# CREATE INDEX IF NOT EXISTS is safe to run repeatedly.
+_INDEX_DDL = [
+    # GET /repos:             ORDER BY ingested_at DESC (index scan, no sort)
+    """
+    CREATE INDEX IF NOT EXISTS idx_repos_ingested_at
+    ON repos(ingested_at DESC);
+    """,
+
     # list_files (ls mode):   WHERE repo_id = $1 AND parent_path = $2
-    await conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_dir_listing
-        ON files(repo_id, parent_path);
-    """)
+    """
+    CREATE INDEX IF NOT EXISTS idx_dir_listing
+    ON files(repo_id, parent_path);
+    """,
 
     # list_files (find mode): WHERE repo_id = $1 AND name LIKE $2
-    await conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_file_name
-        ON files(repo_id, name);
-    """)
+    """
+    CREATE INDEX IF NOT EXISTS idx_file_name
+    ON files(repo_id, name);
+    """,
 
     # search_code (--glob):   WHERE repo_id = $1 AND extension = $2
-    await conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_file_ext
-        ON files(repo_id, extension);
-    """)
+    """
+    CREATE INDEX IF NOT EXISTS idx_file_ext
+    ON files(repo_id, extension);
+    """,
 
     # search_code (content):  WHERE content LIKE '%literal%'
     # pg_trgm GIN index — accelerates LIKE, ILIKE, and regex on text columns.
-    await conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_content_search
-        ON files USING gin(content gin_trgm_ops);
-    """)
+    """
+    CREATE INDEX IF NOT EXISTS idx_content_search
+    ON files USING gin(content gin_trgm_ops);
+    """,
 
     # list_files (glob on paths): WHERE path LIKE '%pattern%'
-    await conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_path_search
-        ON files USING gin(path gin_trgm_ops);
-    """)
+    """
+    CREATE INDEX IF NOT EXISTS idx_path_search
+    ON files USING gin(path gin_trgm_ops);
+    """,
+]
+
+
+async def _create_schema(pool: asyncpg.Pool):
+    async with pool.acquire() as conn:
+        await conn.execute(_TABLES_SQL)
+
+    # Plain CREATE INDEX takes a SHARE lock, which doesn't conflict with
+    # itself, so builds on the same table can run side by side.
+    await asyncio.gather(*(pool.execute(ddl) for ddl in _INDEX_DDL))
@@ -10,15 +10,18 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend.config import CORS_ORIGINS
 from backend.db import init_db, close_db
 from backend.routers.repos import router as repos_router
+from backend.services.agent import client as openai_client
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Startup: init DB pool + schema. Shutdown: close pool."""
+    """Startup: init DB pool + schema. Shutdown: close pool + OpenAI connections."""
     await init_db()
     yield
+    await openai_client.close()
     await close_db()
 
 
@@ -28,16 +31,16 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS — allow Next.js frontend during local dev
+# CORS — allow the Next.js frontend (localhost:3000 during local dev).
+# Methods/headers are the ones the API actually uses, so Starlette can answer
+# preflights from fixed sets instead of echoing back whatever was requested.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",    # Next.js dev server
-        "http://127.0.0.1:3000",
-    ],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["content-type", "authorization"],
+    max_age=3600,
 )
 
 # Routes
@@ -8,16 +8,16 @@ DELETE /repos/{repo_id}      → Delete repo + all its files
 POST   /repos/{repo_id}/chat → Chat with repo (SSE stream)
 """
 
-import json
 from datetime import datetime
 from uuid import UUID
 
 import asyncpg
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 
-from backend.db import get_conn
+from backend.db import get_conn, get_pool
 from backend.services.ingestion import ingest_repo
 from backend.services.agent import run_agent
 
@@ -38,6 +38,8 @@ class ChatRequest(BaseModel):
 
 
 class RepoResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     repo_id: str
     name: str
     url: str
@@ -71,23 +73,24 @@ async def create_repo(
 # ---------------------------------------------------------------------------
 # GET /repos — List all repos
 # ---------------------------------------------------------------------------
-@router.get("/")
+@router.get("/", response_model=list[RepoResponse])
 async def list_repos(
     conn: asyncpg.Connection = Depends(get_conn),
 ):
     rows = await conn.fetch(
-        "SELECT id, name, url, status, ingested_at FROM repos ORDER BY ingested_at DESC"
+        """
+        SELECT id::text AS repo_id, name, url, status, ingested_at
+        FROM repos
+        ORDER BY ingested_at DESC
+        """
+    )
+    # The query already produces exactly the RepoResponse shape, so encode the
+    # rows in one orjson call instead of N model constructions followed by
+    # FastAPI's jsonable_encoder walk. response_model keeps the OpenAPI schema.
+    return Response(
+        content=orjson.dumps([dict(row) for row in rows]),
+        media_type="application/json",
     )
-    return [
-        RepoResponse(
-            repo_id=str(row["id"]),
-            name=row["name"],
-            url=row["url"],
-            status=row["status"],
-            ingested_at=row["ingested_at"],
-        )
-        for row in rows
-    ]
 
 
 # ---------------------------------------------------------------------------
@@ -98,26 +101,25 @@ async def get_repo(
     repo_id: UUID,
     conn: asyncpg.Connection = Depends(get_conn),
 ):
+    # file_count (for context) is maintained at ingestion time — no count(*)
     row = await conn.fetchrow(
-        "SELECT id, name, url, status, ingested_at FROM repos WHERE id = $1",
+        """
+        SELECT id, name, url, status, ingested_at, file_count
+        FROM repos
+        WHERE id = $1
+        """,
         repo_id,
     )
     if not row:
         raise HTTPException(status_code=404, detail="Repo not found")
 
-    # Also get file count for context
-    file_count = await conn.fetchval(
-        "SELECT count(*) FROM files WHERE repo_id = $1 AND is_directory = false",
-        repo_id,
-    )
-
     return {
         "repo_id": str(row["id"]),
         "name": row["name"],
         "url": row["url"],
         "status": row["status"],
         "ingested_at": row["ingested_at"],
-        "file_count": file_count,
+        "file_count": row["file_count"],
     }
 
 
@@ -146,7 +148,7 @@ async def delete_repo(
 async def chat(
     repo_id: UUID,
     body: ChatRequest,
-    conn: asyncpg.Connection = Depends(get_conn),
+    pool: asyncpg.Pool = Depends(get_pool),
 ):
     """
     Agentic chat — the LLM explores the repo using tools and streams its answer.
@@ -158,8 +160,12 @@ async def chat(
       {"type": "done"}
       {"type": "error",      "content": "..."}
     """
-    # Verify repo exists and is ready
-    row = await conn.fetchrow(
+    # Verify repo exists and is ready.
+    #
+    # Uses the pool rather than a request-scoped connection: the stream runs
+    # after the handler returns, and the agent borrows one connection per
+    # tool call so parallel tool calls actually run in parallel.
+    row = await pool.fetchrow(
         "SELECT status FROM repos WHERE id = $1", repo_id
     )
     if not row:
@@ -173,14 +179,14 @@ async def chat(
     async def event_stream():
         try:
             async for event in run_agent(
-                conn=conn,
+                pool=pool,
                 repo_id=str(repo_id),
                 question=body.question,
                 history=body.history,
             ):
-                yield f"data: {json.dumps(event)}\n\n"
+                yield _sse_frame(event)
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            yield _sse_frame({"type": "error", "content": str(e)})
 
     return StreamingResponse(
         event_stream(),
@@ -191,3 +197,11 @@ async def chat(
             "X-Accel-Buffering": "no",  # disable nginx buffering if behind a proxy
         },
     )
+
+
+def _sse_frame(event: dict) -> bytes:
+    """
+    Encode one SSE event. orjson emits UTF-8 bytes directly, so there is no
+    intermediate str for json.dumps/f-string and no re-encode in uvicorn.
+    """
+    return b"data: " + orjson.dumps(event) + b"\n\n"
@@ -19,11 +19,13 @@ Events yielded:
   {"type": "error",      "content": "..."}
 """
 
+import asyncio
 import json
 from typing import AsyncGenerator
 
 import asyncpg
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from backend.tools.definitions import SYSTEM_PROMPT, TOOLS
 from backend.tools.shell import execute_tool
@@ -31,11 +33,33 @@ from backend.tools.shell import execute_tool
 
 MAX_ITERATIONS = 15
 
-client = AsyncOpenAI()  # reads OPENAI_API_KEY from env
+# Text fragments merged into one text_delta event. OpenAI streams roughly a
+# token per chunk; batching cuts generator hops and SSE frames ~8× for a
+# few tokens of added latency.
+TEXT_DELTA_BATCH = 8
+
+# One process-wide client (reads OPENAI_API_KEY from env). HTTP/2 lets
+# concurrent chats multiplex over one TLS connection, and long-lived
+# keep-alive (httpx's default is 5s) keeps it warm between chats, so each
+# ReAct iteration reuses it instead of re-handshaking. Pool sizes match the
+# SDK's own defaults.
+client = AsyncOpenAI(
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=1000,
+            max_keepalive_connections=100,
+            keepalive_expiry=120,
+        ),
+    ),
+)
+
+# Fixed at import — shared by every conversation, never mutated.
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
 
 
 async def run_agent(
-    conn: asyncpg.Connection,
+    pool: asyncpg.Pool,
     repo_id: str,
     question: str,
     history: list[dict] | None = None,
@@ -45,7 +69,7 @@ async def run_agent(
     Async generator that runs the agentic ReAct loop.
 
     Args:
-        conn:      asyncpg connection (for tool execution)
+        pool:      asyncpg pool (each tool call borrows its own connection)
         repo_id:   which repo the tools operate on
         question:  the user's question
         history:   prior messages [{"role": "user"|"assistant", "content": "..."}]
@@ -57,11 +81,10 @@ async def run_agent(
 
     # --- Build the initial messages array ---
     messages: list[dict] = [
-        {"role": "system", "content": SYSTEM_PROMPT},
+        _SYSTEM_MESSAGE,
+        *(history or ()),
+        {"role": "user", "content": question},
     ]
-    if history:
-        messages.extend(history)
-    messages.append({"role": "user", "content": question})
 
     # --- ReAct loop ---
     for iteration in range(MAX_ITERATIONS):
@@ -82,8 +105,9 @@ async def run_agent(
         )
 
         # Accumulators for the streamed response
-        tool_calls: dict[int, dict] = {}   # index → {id, name, arguments_str}
-        text_content = ""
+        tool_calls: dict[int, dict] = {}   # index → {id, name, arguments_parts}
+        text_buffer: list[str] = []        # pending text fragments
+        has_text = False
 
         # ---------------------------------------------------------------
         # Consume the stream chunk by chunk.
@@ -97,9 +121,13 @@ async def run_agent(
         #   chunk 1: {id: "call_abc", name: "search_code", arguments: ""}
         #   chunk 2: {arguments: '{"patt'}
         #   chunk 3: {arguments: 'ern": "auth"}'}
-        # We concatenate them, then JSON.parse when the stream ends.
+        # We collect the fragments in a list and join them once when the
+        # stream ends (repeated str += is quadratic in the argument length).
         # ---------------------------------------------------------------
         async for chunk in stream:
+            if not chunk.choices:
+                # e.g. a trailing usage-only chunk — nothing to accumulate
+                continue
             choice = chunk.choices[0]
             delta = choice.delta
 
@@ -113,30 +141,44 @@ async def run_agent(
                         tool_calls[idx] = {
                             "id": tc_chunk.id,
                             "name": tc_chunk.function.name,
-                            "arguments_str": "",
+                            "arguments_parts": [],
                         }
 
                     # Append argument fragment
                     if tc_chunk.function.arguments:
-                        tool_calls[idx]["arguments_str"] += tc_chunk.function.arguments
+                        tool_calls[idx]["arguments_parts"].append(tc_chunk.function.arguments)
 
-            # --- Stream text to client immediately ---
+            # --- Stream text to client in small batches ---
             if delta.content:
-                text_content += delta.content
-                yield {"type": "text_delta", "content": delta.content}
+                has_text = True
+                text_buffer.append(delta.content)
+                if len(text_buffer) >= TEXT_DELTA_BATCH:
+                    yield {"type": "text_delta", "content": "".join(text_buffer)}
+                    text_buffer.clear()
+
+        # Flush whatever text is left before any tool/done events
+        if text_buffer:
+            yield {"type": "text_delta", "content": "".join(text_buffer)}
 
         # ---------------------------------------------------------------
-        # Stream ended. Two possible outcomes:
+        # Stream ended. Three possible outcomes:
         #
         # A) tool_calls is non-empty → execute tools, append results, loop
-        # B) text_content is non-empty → final answer, we're done
+        # B) text was streamed → final answer, we're done
+        # C) both empty (only a role announcement arrived) → report it
+        #    instead of ending the chat with a blank answer
         # ---------------------------------------------------------------
 
+        if not tool_calls and not has_text:
+            yield {"type": "error", "content": "Model returned an empty response."}
+            return
+
         if tool_calls:
             # --- Build the assistant message (OpenAI requires this format) ---
             assistant_tool_calls = []
             for idx in sorted(tool_calls.keys()):
                 tc = tool_calls[idx]
+                tc["arguments_str"] = "".join(tc.pop("arguments_parts"))
                 assistant_tool_calls.append({
                     "id": tc["id"],
                     "type": "function",
@@ -151,30 +193,35 @@ async def run_agent(
                 "tool_calls": assistant_tool_calls,
             })
 
-            # --- Execute each tool call ---
+            # --- Parse arguments, notify frontend: tool execution starting ---
+            calls = []
             for idx in sorted(tool_calls.keys()):
                 tc = tool_calls[idx]
-                name = tc["name"]
-                arguments_str = tc["arguments_str"]
 
-                # Parse arguments
                 try:
-                    arguments = json.loads(arguments_str)
+                    arguments = json.loads(tc["arguments_str"])
                 except json.JSONDecodeError:
                     arguments = {}
 
-                # Notify frontend: tool execution starting
+                calls.append((tc, arguments))
                 yield {
                     "type": "tool_start",
-                    "name": name,
+                    "name": tc["name"],
                     "arguments": arguments,
                 }
 
-                # Execute via shell.py dispatcher
-                result = await execute_tool(conn, repo_id, name, arguments)
+            # --- Execute all tool calls concurrently ---
+            # Tool calls within one turn are independent. Each gets its own
+            # pooled connection, since queries on a single asyncpg connection
+            # run one after another. Wall time is the slowest call, not the sum.
+            results = await asyncio.gather(*(
+                _execute_tool_pooled(pool, repo_id, tc["name"], arguments)
+                for tc, arguments in calls
+            ))
 
+            for (tc, _), result in zip(calls, results):
                 # Notify frontend: tool execution done
-                yield {"type": "tool_end", "name": name}
+                yield {"type": "tool_end", "name": tc["name"]}
 
                 # Append tool result to messages (OpenAI requires tool_call_id)
                 messages.append({
@@ -201,3 +248,14 @@ async def run_agent(
         ),
     }
     yield {"type": "done"}
+
+
+async def _execute_tool_pooled(
+    pool: asyncpg.Pool,
+    repo_id: str,
+    name: str,
+    arguments: dict,
+) -> str:
+    """Run one tool call on a connection borrowed from the pool."""
+    async with pool.acquire() as conn:
+        return await execute_tool(conn, repo_id, name, arguments)
@@ -5,32 +5,45 @@ Clone a git repo, walk its files, insert them into PostgreSQL, delete the clone.
 
     URL → git clone --depth 1 → walk → filter → batch INSERT → cleanup
 
-The entire clone lives in a tempdir that auto-deletes when we're done.
+The entire clone lives in a tempdir that is deleted when we're done.
 After ingestion, only the database has the repo's data — no files on disk.
 """
 
 import asyncio
+import logging
+import mmap
 import os
+import shutil
 import tempfile
 import uuid
-from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterator
 
 import asyncpg
 
-from backend.config import MAX_FILE_SIZE
+from backend.config import (
+    COPY_BATCH_BYTES,
+    COPY_BATCH_ROWS,
+    GIT_CLONE_TIMEOUT,
+    INGEST_READ_WORKERS,
+    MAX_FILE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
 # Skip lists — directories, extensions, and filenames to ignore
 # ---------------------------------------------------------------------------
-SKIP_DIRS = {
+SKIP_DIRS = frozenset({
     ".git", "node_modules", "__pycache__", ".venv", "venv", ".env",
     "vendor", "dist", "build", ".next", ".nuxt", "target", "bin", "obj",
     ".idea", ".vscode", ".DS_Store", ".svn", ".hg",
     "coverage", ".cache", ".parcel-cache", ".turbo",
-}
+})
 
-SKIP_EXTENSIONS = {
+SKIP_EXTENSIONS = frozenset({
     # Images
     ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".bmp", ".webp",
     # Fonts
@@ -49,14 +62,20 @@ SKIP_EXTENSIONS = {
     ".sqlite", ".db", ".pickle", ".pkl",
     # Maps
     ".map",
-}
+})
 
-SKIP_FILENAMES = {
+SKIP_FILENAMES = frozenset({
     "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
     "poetry.lock", "Cargo.lock", "composer.lock",
     "Gemfile.lock", "go.sum",
     ".DS_Store", "Thumbs.db",
-}
+})
+
+# Leading bytes checked for NUL to classify a file as binary (same as git)
+BINARY_SNIFF_BYTES = 8192
+
+# Files above this are decoded straight from an mmap instead of read() first
+MMAP_THRESHOLD = 256 * 1024
 
 
 # ---------------------------------------------------------------------------
@@ -75,57 +94,105 @@ async def ingest_repo(conn: asyncpg.Connection, url: str) -> dict:
         Exception on clone failure or DB errors (caller should handle).
     """
 
-    # --- 1. Dedup check ---
-    existing = await conn.fetchrow(
-        "SELECT id, status FROM repos WHERE url = $1", url
-    )
-    if existing:
-        return {
-            "repo_id": str(existing["id"]),
-            "status": "already_exists",
-        }
-
-    # --- 2. Insert repo row ---
+    # --- 1–2. Insert repo row, dedup on the UNIQUE url ---
+    #
+    # One round trip in the common (new URL) case, and no race between a
+    # separate existence check and the INSERT.
     repo_name = _extract_repo_name(url)
     repo_id = uuid.uuid4()
 
-    await conn.execute(
+    inserted = await conn.fetchval(
         """
         INSERT INTO repos (id, url, name, status)
         VALUES ($1, $2, $3, 'ingesting')
+        ON CONFLICT (url) DO NOTHING
+        RETURNING id
         """,
         repo_id, url, repo_name,
     )
+    if inserted is None:
+        existing_id = await conn.fetchval(
+            "SELECT id FROM repos WHERE url = $1", url
+        )
+        return {
+            "repo_id": str(existing_id),
+            "status": "already_exists",
+        }
 
+    tmpdir = tempfile.mkdtemp(prefix="falcon-")
     try:
         # --- 3. Clone into tempdir ---
-        with tempfile.TemporaryDirectory() as tmpdir:
-            clone_path = os.path.join(tmpdir, "repo")
-            await _git_clone(url, clone_path)
-
-            # --- 4–7. Walk, filter, compute fields, read content ---
-            records = _collect_file_records(clone_path, repo_id)
-
-            # --- 8. Batch insert ---
-            if records:
+        clone_path = os.path.join(tmpdir, "repo")
+        await _git_clone(url, clone_path)
+
+        # --- 4–9. Walk/filter/read → stream into COPY, then update status ---
+        #
+        # Records are generated lazily and sent in batches capped by both
+        # COPY_BATCH_ROWS and COPY_BATCH_BYTES of content — many small files
+        # or a few big ones, each COPY stays in the same cost range. Memory is
+        # bounded by one batch plus the read-ahead window (not the whole
+        # repo), and the server writes each batch while we read the next.
+        #
+        # One transaction → one commit (one WAL flush) for the whole
+        # ingest, and the repo only flips to 'ready' together with its files.
+        file_count = 0
+
+        async with conn.transaction():
+            # Files only — is_directory takes its DEFAULT FALSE
+            async for batch, batch_bytes in _batched(
+                _iter_file_records(clone_path, repo_id),
+                COPY_BATCH_ROWS,
+                COPY_BATCH_BYTES,
+            ):
                 await conn.copy_records_to_table(
                     "files",
-                    records=records,
+                    records=batch,
                     columns=[
                         "repo_id", "path", "name", "extension",
-                        "parent_path", "depth", "is_directory", "content",
+                        "parent_path", "depth", "content",
                     ],
                 )
+                file_count += len(batch)
+                logger.debug(
+                    "COPY batch into files: %d rows, %d content bytes",
+                    len(batch), batch_bytes,
+                )
 
-        # --- 9. Update status ---
-        await conn.execute(
-            "UPDATE repos SET status = 'ready' WHERE id = $1", repo_id
-        )
+            # Directory rows are derived from the files' parent paths in one
+            # statement instead of being walked, built, and sent one by one:
+            # each distinct parent_path "a/b/c" expands to its prefixes
+            # "a", "a/b", "a/b/c". Only directories that contain a kept file
+            # get a row.
+            await conn.execute(
+                """
+                INSERT INTO files
+                    (repo_id, path, name, parent_path, depth, is_directory)
+                SELECT DISTINCT
+                    $1::uuid,
+                    array_to_string(parts[1:n], '/'),
+                    parts[n],
+                    array_to_string(parts[1:n - 1], '/'),
+                    n,
+                    true
+                FROM (
+                    SELECT DISTINCT string_to_array(parent_path, '/') AS parts
+                    FROM files
+                    WHERE repo_id = $1 AND parent_path <> ''
+                ) p
+                CROSS JOIN LATERAL generate_series(1, cardinality(parts)) AS n
+                """,
+                repo_id,
+            )
+
+            await conn.execute(
+                "UPDATE repos SET status = 'ready', file_count = $2 WHERE id = $1",
+                repo_id, file_count,
+            )
 
         return {
             "repo_id": str(repo_id),
             "status": "ready",
-            "file_count": len(records),
+            "file_count": file_count,
         }
 
     except Exception:
@@ -135,10 +202,33 @@ async def ingest_repo(conn: asyncpg.Connection, url: str) -> dict:
         )
         raise
 
+    finally:
+        # --- 10. Delete the clone ---
+        # Everything we need is in the database by now; the response doesn't
+        # have to wait for rmtree to unlink every file in the checkout.
+        _delete_in_background(tmpdir)
+
 
 # ---------------------------------------------------------------------------
 # Internals
 # ---------------------------------------------------------------------------
+
+# Strong refs to fire-and-forget cleanup tasks (the loop only keeps weak ones).
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _delete_in_background(path: str):
+    """
+    Remove a directory tree in a worker thread without awaiting it.
+    The tree-walk runs off the event loop and off the request's critical path.
+    """
+    task = asyncio.create_task(
+        asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 def _extract_repo_name(url: str) -> str:
     """
     "https://github.com/expressjs/express.git" → "expressjs/express"
@@ -161,116 +251,299 @@ def _extract_repo_name(url: str) -> str:
     return clean
 
 
+# Non-cone sparse-checkout patterns (gitignore syntax) built from the skip
+# lists. Matching paths are never checked out, so with a blob-less clone their
+# blobs are never downloaded either. Case-sensitive, unlike the walker's
+# extension check — anything that slips through is still filtered there.
+_SPARSE_PATTERNS = "\n".join(
+    ["/*"]
+    + [f"!{d}/" for d in sorted(SKIP_DIRS)]
+    + [f"!*{ext}" for ext in sorted(SKIP_EXTENSIONS)]
+    + [f"!{name}" for name in sorted(SKIP_FILENAMES)]
+) + "\n"
+
+
+# Config for every git call on the throwaway clone (GIT_CONFIG_* env, so it
+# also reaches child processes like index-pack): no fsync for files we're
+# about to delete, no background gc or commit-graph writes, and fetched packs
+# are kept as packs instead of being exploded into loose objects.
+_GIT_CONFIG = {
+    "core.fsync": "none",
+    "gc.auto": "0",
+    "fetch.writeCommitGraph": "false",
+    "transfer.unpackLimit": "1",
+}
+
+
+def _git_config_env(config: dict[str, str]) -> dict[str, str]:
+    """`config` as GIT_CONFIG_COUNT / _KEY_n / _VALUE_n variables."""
+    env = {"GIT_CONFIG_COUNT": str(len(config))}
+    for i, (key, value) in enumerate(config.items()):
+        env[f"GIT_CONFIG_KEY_{i}"] = key
+        env[f"GIT_CONFIG_VALUE_{i}"] = value
+    return env
+
+
+# Only our keys are fixed at import; they're merged into the live os.environ
+# on every spawn so proxy, credential, and SSH agent changes still reach git.
+_GIT_CONFIG_ENV = _git_config_env(_GIT_CONFIG)
+
+
 async def _git_clone(url: str, dest: str):
     """
-    Shallow clone a repo. Raises on failure.
+    Shallow clone a repo. Raises on failure or after GIT_CLONE_TIMEOUT seconds.
+
+    Clones without blobs and without a checkout, excludes the skip lists via
+    sparse-checkout, then checks out — git fetches only the blobs we keep
+    (one batched request), not lockfiles, node_modules, or binary assets.
+    Servers without partial-clone support send a full shallow clone instead.
+
+    An empty repo (unborn HEAD) is left as a bare checkout: 0 files.
+    Where `sparse-checkout set --no-cone` is unavailable (git < 2.35), falls
+    back to a plain `--depth 1` clone; the walker still filters everything.
+    """
+    # One deadline across all the git steps
+    try:
+        async with asyncio.timeout(GIT_CLONE_TIMEOUT):
+            await _run_git(
+                "clone", "--depth", "1", "--single-branch",
+                "--filter=blob:none", "--no-checkout", url, dest,
+            )
+
+            # Nothing to check out in an empty repo
+            if await _run_git(
+                "-C", dest, "rev-parse", "--verify", "--quiet", "HEAD",
+                check=False,
+            ):
+                return
+
+            if await _run_git(
+                "-C", dest, "sparse-checkout", "set", "--no-cone", "--stdin",
+                input=_SPARSE_PATTERNS.encode(),
+                check=False,
+            ):
+                await asyncio.to_thread(shutil.rmtree, dest)
+                await _run_git("clone", "--depth", "1", "--single-branch", url, dest)
+                return
+
+            await _run_git("-C", dest, "checkout")
+    except TimeoutError:
+        raise RuntimeError(f"git clone timed out after {GIT_CLONE_TIMEOUT:g}s")
+
+
+async def _run_git(
+    *args: str,
+    input: bytes | None = None,
+    check: bool = True,
+) -> int:
+    """
+    Run one git command and return its exit code.
+    With check=True (the default), raises RuntimeError on a non-zero exit.
     """
     proc = await asyncio.create_subprocess_exec(
-        "git", "clone", "--depth", "1", "--single-branch", url, dest,
+        "git", *args,
+        env={**os.environ, **_GIT_CONFIG_ENV},
+        stdin=asyncio.subprocess.PIPE if input is not None else None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
     )
-    _, stderr = await proc.communicate()
 
-    if proc.returncode != 0:
+    # communicate() drains stdout and stderr together and waits for exit,
+    # so a chatty child can't block on a full pipe. If the caller's deadline
+    # cancels us, don't leave the child running.
+    try:
+        _, stderr = await proc.communicate(input)
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if check and proc.returncode != 0:
+        command = args[2] if args[0] == "-C" else args[0]
         raise RuntimeError(
-            f"git clone failed (exit {proc.returncode}): {stderr.decode().strip()}"
+            f"git {command} failed (exit {proc.returncode}): "
+            f"{stderr.decode().strip()}"
         )
+    return proc.returncode
+
+
+# File reads overlap on these threads; the walk itself stays on the loop.
+_read_pool = ThreadPoolExecutor(
+    max_workers=INGEST_READ_WORKERS, thread_name_prefix="falcon-read"
+)
 
+# Reads in flight at once — keeps every worker busy while bounding how many
+# file contents are held in memory ahead of COPY.
+_READ_AHEAD = INGEST_READ_WORKERS * 2
 
-def _collect_file_records(
+
+async def _iter_file_records(
     clone_path: str,
     repo_id: uuid.UUID,
-) -> list[tuple]:
+) -> AsyncIterator[tuple]:
     """
     Walk the cloned repo, filter junk, compute fields, read content.
 
-    Returns a list of tuples ready for asyncpg.copy_records_to_table():
-        (repo_id, path, name, extension, parent_path, depth, is_directory, content)
+    Yields one tuple per kept file, ready for asyncpg.copy_records_to_table():
+        (repo_id, path, name, extension, parent_path, depth, content)
+
+    Reads are fanned out to _read_pool so disk I/O overlaps, with up to
+    _READ_AHEAD in flight; records come out in walk order either way.
     """
-    records = []
-    root = Path(clone_path)
-
-    for dirpath, dirnames, filenames in os.walk(root):
-        # --- Filter directories in-place (prevents os.walk from descending) ---
-        dirnames[:] = [
-            d for d in dirnames
-            if d not in SKIP_DIRS
-        ]
-
-        rel_dir = Path(dirpath).relative_to(root)
-        rel_dir_str = str(rel_dir) if str(rel_dir) != "." else ""
-
-        # --- Insert directory entries (except root) ---
-        if rel_dir_str:
-            dir_name = rel_dir.name
-            dir_parent = str(rel_dir.parent) if str(rel_dir.parent) != "." else ""
-            dir_depth = len(rel_dir.parts)
-
-            records.append((
-                repo_id,
-                rel_dir_str,        # path
-                dir_name,           # name
-                None,               # extension
-                dir_parent,         # parent_path
-                dir_depth,          # depth
-                True,               # is_directory
-                None,               # content
-            ))
+    loop = asyncio.get_running_loop()
+    pending: deque[tuple[tuple, asyncio.Future]] = deque()
+
+    for record, path, size in _walk(clone_path, repo_id):
+        pending.append(
+            (record, loop.run_in_executor(_read_pool, _read_text, path, size))
+        )
+        if len(pending) < _READ_AHEAD:
+            continue
+
+        record, read = pending.popleft()
+        content = await read
+        if content is not None:
+            yield record[:6] + (content,)
 
-        # --- Insert file entries ---
-        for filename in filenames:
+    while pending:
+        record, read = pending.popleft()
+        content = await read
+        if content is not None:
+            yield record[:6] + (content,)
+
+
+def _walk(
+    clone_path: str,
+    repo_id: uuid.UUID,
+) -> Iterator[tuple[tuple, str, int]]:
+    """
+    Walk the cloned repo and filter junk, without reading file contents.
+
+    Yields (record, path, size) per kept file: the record (content still
+    None) plus the absolute path and size to read. Directories are descended
+    into but not yielded — ingest_repo derives their rows in SQL.
+
+    Iterative os.scandir walk: DirEntry gives us name/path/type straight from
+    the directory read, and relative paths are built by string concatenation —
+    no Path objects or relative_to() calls per entry.
+    """
+    # (absolute dir, relative dir ('' for root), depth of the dir)
+    stack = [(clone_path, "", 0)]
+
+    while stack:
+        dir_abs, dir_rel, dir_depth = stack.pop()
+        prefix = dir_rel + "/" if dir_rel else ""
+        depth = dir_depth + 1   # depth of this dir's children
+
+        try:
+            with os.scandir(dir_abs) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for entry in entries:
+            name = entry.name
+            rel_path = prefix + name
+
+            # Never follow symlinks, to files or directories: a repo can ship
+            # `x -> /etc/passwd` or a link to our own .env, and whatever it
+            # points at would be stored and served back by the tools.
+            if entry.is_symlink():
+                continue
+
+            # --- Directories: skip junk ---
+            if entry.is_dir():
+                if name in SKIP_DIRS:
+                    continue
+
+                stack.append((entry.path, rel_path, depth))
+                continue
+
+            # --- Files ---
             # Skip by filename
-            if filename in SKIP_FILENAMES:
+            if name in SKIP_FILENAMES:
                 continue
 
-            # Skip by extension
-            ext = _get_extension(filename)
+            # Skip by extension — "test.spec.TS" → ".ts"; "Dockerfile" and
+            # dotfiles like ".gitignore" have none (as with os.path.splitext)
+            dot = name.rfind(".")
+            ext = name[dot:].lower() if dot > 0 else None
             if ext in SKIP_EXTENSIONS:
                 continue
 
-            filepath = Path(dirpath) / filename
-            rel_path = filepath.relative_to(root)
-            rel_path_str = str(rel_path)
-
             # Skip files that are too large
             try:
-                file_size = filepath.stat().st_size
+                file_size = entry.stat().st_size
             except OSError:
                 continue
             if file_size > MAX_FILE_SIZE:
                 continue
 
-            # Skip binary files (can't decode as UTF-8)
-            try:
-                content = filepath.read_text(encoding="utf-8")
-            except (UnicodeDecodeError, OSError):
-                continue
-
-            file_name = rel_path.name
-            file_parent = str(rel_path.parent) if str(rel_path.parent) != "." else ""
-            file_depth = len(rel_path.parts)
-
-            records.append((
+            # Content is read (and binaries dropped) by _iter_file_records
+            yield (
                 repo_id,
-                rel_path_str,       # path
-                file_name,          # name
-                ext or None,        # extension (None if no extension)
-                file_parent,        # parent_path
-                file_depth,         # depth
-                False,              # is_directory
-                content,            # content
-            ))
-
-    return records
+                rel_path,           # path
+                name,               # name
+                ext,                # extension (None if no extension)
+                dir_rel,            # parent_path
+                depth,              # depth
+                None,               # content
+            ), entry.path, file_size
 
 
-def _get_extension(filename: str) -> str:
+def _read_text(path: str, size: int) -> str | None:
     """
-    "login.py"       → ".py"
-    "Dockerfile"     → ""
-    "test.spec.ts"   → ".ts"
-    ".gitignore"     → ".gitignore"
+    Read a file as UTF-8 text. Returns None for binary or unreadable files.
+
+    Sniffs the first 8KB for a NUL byte first (git's own binary heuristic),
+    so most binaries are rejected after one small read — no full read, no
+    throwaway decode, no exception. Files over MMAP_THRESHOLD are decoded
+    directly from a read-only mapping of the page cache, skipping the
+    intermediate bytes copy. Newlines are normalized to \\n, as a text-mode
+    open() would.
+    """
+    try:
+        with open(path, "rb") as f:
+            if size > MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm.find(b"\0", 0, BINARY_SNIFF_BYTES) != -1:
+                        return None
+                    text = str(mm, "utf-8")
+            else:
+                head = f.read(BINARY_SNIFF_BYTES)
+                if b"\0" in head:
+                    return None
+                rest = f.read()
+                text = (head + rest if rest else head).decode("utf-8")
+    except OSError:
+        return None
+    except UnicodeDecodeError:
+        return None   # NUL-free but not UTF-8 (e.g. Latin-1) — rare
+
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+async def _batched(
+    records: AsyncIterable[tuple],
+    max_rows: int,
+    max_bytes: int,
+) -> AsyncIterator[tuple[list[tuple], int]]:
+    """
+    Group a file record stream into (batch, content size) pairs.
+
+    A batch is cut as soon as it reaches max_rows records or max_bytes of
+    content (counted in characters — close enough for sizing).
     """
-    _, ext = os.path.splitext(filename)
-    return ext.lower()
+    batch = []
+    size = 0
+    async for record in records:
+        batch.append(record)
+        size += len(record[6])   # content
+        if len(batch) >= max_rows or size >= max_bytes:
+            yield batch, size
+            batch = []
+            size = 0
+    if batch:
+        yield batch, size
@@ -14,6 +14,7 @@ Under the hood, every call is a database query against ingested repo files.
 import re
 import fnmatch
 import asyncpg
+from functools import lru_cache
 from typing import Optional
 
 
@@ -22,6 +23,9 @@ MAX_LIST_RESULTS = 200
 MAX_FILE_LINES = 500
 MAX_SEARCH_MATCHES = 50
 
+# Candidate files (full content each) per cursor round trip in search_code
+SEARCH_PREFETCH = 8
+
 
 # ---------------------------------------------------------------------------
 # Tool 1: list_files
@@ -36,7 +40,7 @@ MAX_SEARCH_MATCHES = 50
 #   list_files("src/**/*.test.js")  → find src/ -name "*.test.js"
 #
 # Directory mode: indexed query on parent_path
-# Glob mode:      fetch all paths (~3K strings), fnmatch in Python
+# Glob mode:      glob → LIKE on path (trigram index), fnmatch only for [...]
 # ---------------------------------------------------------------------------
 async def list_files(
     conn: asyncpg.Connection,
@@ -52,36 +56,49 @@ async def list_files(
 
     if is_glob:
         # ----------------------------------------------------------
-        # Glob mode: fetch all paths for this repo, filter in Python.
+        # Glob mode: translate the glob to LIKE, filter in PostgreSQL.
         #
-        # ~3K path strings ≈ 100KB — trivial to transfer and filter.
-        # fnmatch handles **, *, ? natively.
+        # fnmatch's * crosses "/" just like LIKE's %, so *, ** and ?
+        # translate exactly — only matching paths cross the wire, and
+        # only the first page of them. [...] classes have no LIKE form;
+        # they become _ and fnmatch re-checks the (narrowed) rows.
         #
-        # Query:  SELECT path, is_directory FROM files
-        #         WHERE repo_id = $1
+        # Query:  SELECT path, is_directory, count(*) OVER () AS total
+        #         FROM files
+        #         WHERE repo_id = $1 AND path LIKE $2
         #         ORDER BY path
         #
-        # Index:  idx_dir_listing(repo_id, parent_path) — repo_id prefix
+        # Index:  idx_path_search GIN(path gin_trgm_ops) — LIKE '%...%'
         # ----------------------------------------------------------
-        rows = await conn.fetch(
-            "SELECT path, is_directory FROM files WHERE repo_id = $1 ORDER BY path",
-            repo_id,
-        )
-
-        matched = [
-            row for row in rows
-            if fnmatch.fnmatch(row["path"], path)
-        ]
+        like_pattern, exact = _glob_to_like(path)
+        query = """
+            SELECT path, is_directory, count(*) OVER () AS total
+            FROM files
+            WHERE repo_id = $1 AND path LIKE $2
+            ORDER BY path
+        """
+
+        if exact:
+            matched = await conn.fetch(
+                query + f" LIMIT {MAX_LIST_RESULTS}", repo_id, like_pattern
+            )
+            total = matched[0]["total"] if matched else 0
+        else:
+            rows = await conn.fetch(query, repo_id, like_pattern)
+            glob_re = _glob_regex(path)
+            matched = [row for row in rows if glob_re.match(row["path"])]
+            total = len(matched)
 
         if not matched:
             return f"No files matching: {path}"
 
-        lines = []
-        for row in matched[:MAX_LIST_RESULTS]:
-            lines.append(row["path"] + "/" if row["is_directory"] else row["path"])
+        lines = [
+            row["path"] + "/" if row["is_directory"] else row["path"]
+            for row in matched[:MAX_LIST_RESULTS]
+        ]
 
-        if len(matched) > MAX_LIST_RESULTS:
-            lines.append(f"\n... {len(matched) - MAX_LIST_RESULTS} more results. Narrow your glob.")
+        if total > MAX_LIST_RESULTS:
+            lines.append(f"\n... {total - MAX_LIST_RESULTS} more results. Narrow your glob.")
 
         return "\n".join(lines)
 
@@ -109,11 +126,64 @@ async def list_files(
         if not rows:
             return f"ls: cannot access '{path or '.'}': No such file or directory"
 
-        lines = []
-        for row in rows:
-            lines.append(row["name"] + "/" if row["is_directory"] else row["name"])
+        return "\n".join([
+            row["name"] + "/" if row["is_directory"] else row["name"]
+            for row in rows
+        ])
 
-        return "\n".join(lines)
+
+@lru_cache(maxsize=256)
+def _glob_regex(glob: str) -> re.Pattern:
+    """
+    Compiled regex for an fnmatch glob, cached across calls — the agent
+    tends to repeat globs, and translate() + compile() is the costly part.
+    """
+    return re.compile(fnmatch.translate(glob))
+
+
+def _glob_to_like(glob: str) -> tuple[str, bool]:
+    """
+    Translate an fnmatch glob into a LIKE pattern.
+    Returns (pattern, exact) — exact is False if fnmatch must re-check.
+
+    "src/**/*.py"  → ("src/%/%.py", True)
+    "test_?.js"    → ("test\\__.js", True)    (literal _ escaped)
+    "[ab]*.py"     → ("_%.py", False)         (class → any one char)
+    """
+    out = []
+    exact = True
+    i, n = 0, len(glob)
+
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            out.append("%")
+            while i + 1 < n and glob[i + 1] == "*":
+                i += 1
+        elif c == "?":
+            out.append("_")
+        elif c == "[":
+            # Same bracket rules as fnmatch: leading ! or ^, then a ]
+            # right after the opener is literal; unclosed [ is literal.
+            j = i + 1
+            if j < n and glob[j] in "!^":
+                j += 1
+            if j < n and glob[j] == "]":
+                j += 1
+            close = glob.find("]", j)
+            if close == -1:
+                out.append("[")
+            else:
+                out.append("_")
+                exact = False
+                i = close
+        elif c in "%_\\":
+            out.append("\\" + c)
+        else:
+            out.append(c)
+        i += 1
+
+    return "".join(out), exact
 
 
 # ---------------------------------------------------------------------------
@@ -129,7 +199,9 @@ async def list_files(
 #   read_file("auth.py", start_line=-10)            → tail  (last 10)
 #   read_file("auth.py", start_line=50, end_line=70) → sed  (lines 50–70)
 #
-# Query:  SELECT content, is_directory FROM files
+# Query:  split content into lines and slice the array in PostgreSQL,
+#         so only the requested lines (at most MAX_FILE_LINES) are sent
+#         back — not the whole file — along with the total line count
 #         WHERE repo_id = $1 AND path = $2
 #
 # Index:  UNIQUE(repo_id, path)
@@ -148,10 +220,40 @@ async def read_file(
 
     path = path.strip("/").lstrip("./")
 
+    # --- Determine the slice (1-indexed, inclusive: lo..hi) ---
+    #
+    #   tail mode:  start_line=-10        → last 10 lines
+    #   cat / head / sed:  start_line..end_line, defaulting to 1..total;
+    #                      a negative end_line counts back from the end
+    #
+    # The CASE keeps "" as one empty line, like str.split("\n") does.
+    #
     row = await conn.fetchrow(
-        "SELECT content, is_directory FROM files WHERE repo_id = $1 AND path = $2",
+        """
+        SELECT f.is_directory, t.total, b.lo, b.hi,
+               f.lines[b.lo : least(b.hi, b.lo + $5 - 1)] AS selected
+        FROM (
+            SELECT is_directory,
+                   CASE WHEN content = '' THEN '{""}'::text[]
+                        ELSE string_to_array(content, E'\\n') END AS lines
+            FROM files
+            WHERE repo_id = $1 AND path = $2
+        ) f
+        CROSS JOIN LATERAL (SELECT cardinality(f.lines) AS total) t
+        CROSS JOIN LATERAL (
+            SELECT
+                CASE WHEN $3 < 0 THEN greatest(t.total + $3 + 1, 1)
+                     ELSE greatest(coalesce($3, 1), 1) END AS lo,
+                CASE WHEN $3 < 0 THEN t.total
+                     WHEN $4 < 0 THEN t.total + $4
+                     ELSE least(coalesce(nullif($4, 0), t.total), t.total) END AS hi
+        ) b
+        """,
         repo_id,
         path,
+        start_line,
+        end_line,
+        MAX_FILE_LINES,
     )
 
     if not row:
@@ -159,38 +261,21 @@ async def read_file(
     if row["is_directory"]:
         return f"Error: {path}: Is a directory"
 
-    lines = row["content"].split("\n")
-    total = len(lines)
+    total = row["total"]
+    first_num = row["lo"]
+    selected = row["selected"]
 
-    # --- Determine the slice ---
-
-    if start_line is not None and start_line < 0:
-        # tail mode: start_line=-10 → last 10 lines
-        selected = lines[start_line:]
-        first_num = total + start_line + 1
-    else:
-        # cat / head / sed mode
-        s = (start_line or 1) - 1   # 1-indexed → 0-indexed
-        e = end_line or total
-        selected = lines[s:e]
-        first_num = s + 1
-
-    # --- Truncate if too long (cat on a huge file) ---
-
-    truncated = False
-    if len(selected) > MAX_FILE_LINES:
-        selected = selected[:MAX_FILE_LINES]
-        truncated = True
+    # Truncated if the requested range was longer than what was sent
+    # (cat on a huge file)
+    truncated = row["hi"] - first_num + 1 > MAX_FILE_LINES
 
     # --- Format with line numbers ---
 
     width = len(str(first_num + len(selected) - 1))
-    output = []
-    for i, line in enumerate(selected):
-        num = first_num + i
-        output.append(f"{num:>{width}} | {line}")
-
-    result = "\n".join(output)
+    result = "\n".join([
+        f"{num:>{width}} | {line}"
+        for num, line in enumerate(selected, first_num)
+    ])
 
     if truncated:
         result += (
@@ -216,12 +301,17 @@ async def read_file(
 #           WHERE content LIKE '%def%' AND content LIKE '%authenticate%'
 #           Narrows 3,000 files → maybe 5 candidates.
 #
-#   Step 3: Python re.search() on candidates for precise line matching
-#           Full PCRE: \w, \d, \s, lookaheads — everything works.
+#   Step 3: Line-level matching on the candidates
+#     Plain patterns (no backslashes or (?...) groups — the common "word"
+#     search): split and match lines in PostgreSQL, return only the matching
+#     (path, line number, line) rows instead of every candidate's content.
+#     Everything else: Python re.search() line by line — full PCRE:
+#     \w, \d, \s, lookaheads — everything works.
 #
-# Why not PostgreSQL regex directly?
-#   PG uses POSIX regex — no \w, \d, \s support.
-#   The LLM will naturally generate PCRE patterns. They'd break in PG.
+# Why not PostgreSQL regex for everything?
+#   PG's regex dialect diverges from Python's on escapes (\b is backspace,
+#   word boundaries are \y) and extensions. The LLM naturally generates
+#   PCRE patterns; only the subset both dialects read the same goes to PG.
 #
 # Output mimics ripgrep:
 #   src/auth/login.py:10:def authenticate(user, password):
@@ -229,16 +319,63 @@ async def read_file(
 # ---------------------------------------------------------------------------
 
 
+# Compiled once at import — these run on every search_code call.
+_LITERAL_RE = re.compile(r"[a-zA-Z0-9_]{3,}")   # trigram-usable literal runs
+# Whole escapes — \b, \s, \. but also \x41, \u00e9, \N{...}, \101 — never
+# literal text as written
+_ESCAPE_RE = re.compile(
+    r"\\(?:x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|[0-7]{1,3}|.)"
+)
+_CLASS_RE = re.compile(r"\[\^?\]?[^\]]*\]")       # [abc], [^]x] — one unknown char
+_OPTIONAL_CHAR_RE = re.compile(r"\w(?=[?*]|\{0|\{,)")   # colou?r — u may be absent
+_BOUNDS_RE = re.compile(r"\{[\d,]*\}")           # {1000} is a count, not text
+_NOT_ANDABLE_RE = re.compile(r"\||\(\?|\)(?:[?*]|\{0|\{,)")  # a|b, (?i), (x)?
+
+# LIKEs per search — the longest literals are the most selective; more
+# (shorter, common ones like "def") add index work for little narrowing.
+MAX_PREFILTER_LITERALS = 2
+_EXT_GLOB_RE = re.compile(r"^\*(\.\w+)$")       # "*.py" → ".py"
+
+# Syntax whose meaning differs between Python re and PG regex (escapes,
+# (?...) extensions, {} bounds, POSIX [:class:] / [=equiv=] / [.coll.])
+_PG_UNSAFE_RE = re.compile(r"\\|\(\?|\{|\[[:=.]")
+
+_SEARCH_TRUNCATED = (
+    f"\n... truncated at {MAX_SEARCH_MATCHES} matches. "
+    f"Narrow with glob or a more specific pattern."
+)
+
+
 def _extract_literals(pattern: str) -> list[str]:
     """
     Pull literal substrings (3+ chars) from a regex for pg_trgm pre-filtering.
     Trigram indexes need at least 3 characters to be useful.
 
-    "def\\s+authenticate"   → ["def", "authenticate"]
+    Every literal returned must appear in any matching line, so escapes,
+    character classes, {n,m} bounds, and optional characters are cut out,
+    and patterns with alternation, (?...) groups, or optional groups yield
+    none. Of the rest, literals contained in longer ones are dropped and
+    only the MAX_PREFILTER_LITERALS longest are kept.
+
+    "def\\s+authenticate"   → ["authenticate", "def"]
     "import\\s+(\\w+)"      → ["import"]
+    "colou?r_name"          → ["r_name", "colo"]
     "\\d+\\.\\d+"           → []  (no literals → falls back to full scan)
+    "login|logout"          → []  (either branch may match alone)
     """
-    return re.findall(r"[a-zA-Z0-9_]{3,}", pattern)
+    pattern = _ESCAPE_RE.sub(" ", pattern)
+    pattern = _CLASS_RE.sub(" ", pattern)
+    if _NOT_ANDABLE_RE.search(pattern):
+        return []
+    pattern = _OPTIONAL_CHAR_RE.sub(" ", pattern)
+    pattern = _BOUNDS_RE.sub(" ", pattern)
+
+    literals = sorted(set(_LITERAL_RE.findall(pattern)), key=len, reverse=True)
+    kept: list[str] = []
+    for lit in literals:
+        if not any(lit in longer for longer in kept):
+            kept.append(lit)
+    return kept[:MAX_PREFILTER_LITERALS]
 
 
 async def search_code(
@@ -262,6 +399,11 @@ async def search_code(
     # Each LIKE '%literal%' uses:
     #   idx_content_search GIN(content gin_trgm_ops)
     #
+    # Keep them as separate predicates: the planner folds them into ONE
+    # bitmap scan of the GIN index (one scan key per LIKE). The tempting
+    # `content LIKE ALL($2::text[])` is not indexable — Postgres only matches
+    # ANY-style array clauses to indexes — and would scan every file.
+    #
     # If no literals extracted (pure regex like \d+), we scan all files.
     # With repo_id scoping, that's still only ~3K files.
     #
@@ -276,7 +418,7 @@ async def search_code(
 
     # --glob filter
     if glob:
-        ext_match = re.match(r"^\*(\.\w+)$", glob)
+        ext_match = _EXT_GLOB_RE.match(glob)
         if ext_match:
             # "*.py" → extension = '.py' (equality, idx_file_ext)
             conditions.append(f"extension = ${idx}")
@@ -288,17 +430,45 @@ async def search_code(
             params.append(like_glob)
         idx += 1
 
+    where = " AND ".join(conditions)
+
+    # --- Step 3a: plain patterns — match lines in PostgreSQL ---
+    #
+    # Only matching lines cross the wire, already numbered, ordered, and
+    # capped. If PG still rejects the pattern, fall through to Python.
+    #
+    if not _PG_UNSAFE_RE.search(pattern):
+        try:
+            matches = await conn.fetch(
+                f"""
+                SELECT path, lineno, line
+                FROM files
+                CROSS JOIN LATERAL regexp_split_to_table(content, E'\\n')
+                    WITH ORDINALITY AS l(line, lineno)
+                WHERE {where} AND line ~ ${idx}
+                ORDER BY path, lineno
+                LIMIT {MAX_SEARCH_MATCHES}
+                """,
+                *params, pattern,
+            )
+        except asyncpg.InvalidRegularExpressionError:
+            pass
+        else:
+            if not matches:
+                return f"No matches found for pattern: {pattern}"
+
+            output = [f"{m['path']}:{m['lineno']}:{m['line']}" for m in matches]
+            if len(matches) >= MAX_SEARCH_MATCHES:
+                output.append(_SEARCH_TRUNCATED)
+            return "\n".join(output)
+
     query = f"""
         SELECT path, content FROM files
-        WHERE {' AND '.join(conditions)}
+        WHERE {where}
         ORDER BY path
     """
-    rows = await conn.fetch(query, *params)
 
-    if not rows:
-        return f"No matches found for pattern: {pattern}"
-
-    # --- Step 3: Python regex for precise line-level matching ---
+    # --- Step 3b: Python regex for precise line-level matching ---
     #
     # pg_trgm found candidate files.
     # Now apply the real regex line-by-line to get:
@@ -306,21 +476,23 @@ async def search_code(
     #   - line numbers
     #   - ripgrep-style output
     #
+    # Candidates are streamed through a server-side cursor a few rows at a
+    # time, so once MAX_SEARCH_MATCHES is hit the remaining files' content
+    # is never sent (fetch() would ship every candidate up front).
+    #
     output = []
     match_count = 0
 
-    for row in rows:
-        file_lines = row["content"].split("\n")
-        for line_num, line in enumerate(file_lines, 1):
-            if compiled.search(line):
-                output.append(f"{row['path']}:{line_num}:{line}")
-                match_count += 1
-                if match_count >= MAX_SEARCH_MATCHES:
-                    output.append(
-                        f"\n... truncated at {MAX_SEARCH_MATCHES} matches. "
-                        f"Narrow with glob or a more specific pattern."
-                    )
-                    return "\n".join(output)
+    async with conn.transaction(readonly=True):
+        async for row in conn.cursor(query, *params, prefetch=SEARCH_PREFETCH):
+            file_lines = row["content"].split("\n")
+            for line_num, line in enumerate(file_lines, 1):
+                if compiled.search(line):
+                    output.append(f"{row['path']}:{line_num}:{line}")
+                    match_count += 1
+                    if match_count >= MAX_SEARCH_MATCHES:
+                        output.append(_SEARCH_TRUNCATED)
+                        return "\n".join(output)
 
     if not output:
         # pg_trgm found files with the literal substrings,